@@ -1,44 +1,31 @@
-from pathlib import Path
+import argparse
 import asyncio
-from test_html_lib.html_tester import html_tester_singleton
-import sys
+from test_html_lib.html_tester import get_tester
 
 
-async def main():
-    status, errors = await html_tester_singleton.test(html_snippet)
-    
-    print(status)
-    print("Errors:")
-    for error in errors:
-        print(error)
-
 def get_file_content(file_name: str):
     with open(file_name, "r", encoding="utf-8") as file:
         return file.read()
-    
-command_line_args = sys.argv
-if(len(command_line_args) > 1):
-    file_name = command_line_args[1]
-else:
-    file_name = "html_snippet.html"
-    
-if(len(command_line_args) > 2):
-    max_wait_time_seconds = float(command_line_args[2])
-else:
-    max_wait_time_seconds = 2.0
-    
-print(f"using file: {file_name}, to test with max wait time of {max_wait_time_seconds} seconds")
-
-    
-html_tester_singleton.max_wait_time_seconds = max_wait_time_seconds
-html_snippet = get_file_content(file_name)
-
-
-asyncio.run(main())
-
 
+async def main(file_name: str, max_wait_time_seconds: float):
+    print(f"using file: {file_name}, to test with max wait time of {max_wait_time_seconds} seconds")
 
+    tester = get_tester()
+    tester.max_wait_time_seconds = max_wait_time_seconds
+    status, errors = await tester.test(get_file_content(file_name))
 
+    print(status)
+    print("Errors:")
+    for error in errors:
+        print(error)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tests an html snippet in a browser and prints its errors")
+    parser.add_argument("file", nargs="?", default="html_snippet.html", help="html snippet to test")
+    parser.add_argument("--wait", type=float, default=2.0, help="max wait time in seconds for the page errors")
+    return parser.parse_args()
 
 
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(main(args.file, args.wait))
@@ -1,5 +1,7 @@
 
+import asyncio
 import base64
+import os
 import time
 import sqlparse
 import requests
@@ -8,7 +10,6 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from seleniumwire.handler import Request
 from sqlparse.sql import Identifier, Statement, TokenList, Token, IdentifierList
-from stopwatch import Stopwatch
 
 #TODO: Otimizar todo o script carregando na memora do chart e da library mockada
 #TODO: Mockar o fetch voltando o resultado somente com os headers.
@@ -28,22 +29,20 @@ chrome_options.add_argument("--enable-logging")
 chrome_options.add_argument("--log-level=3")
 
 chart_library_url = "https://cdn.jsdelivr.net/npm/chart.js"
+DEFAULT_DEBUG_HOLD_SECONDS = 120
 
 
 def get_column_names(statement: Statement):
     names = []
-    def parse_tokens_resursive(token):
-        if(type(token) == Identifier):
+    stack = list(reversed(statement.tokens))
+    while(stack):
+        token = stack.pop()
+        if(isinstance(token, Identifier)):
             names.append(token.get_name())
-
-        if(type(token) == IdentifierList):
-            for identifier in token.get_identifiers():
-                parse_tokens_resursive(identifier)
-        if(type(token) == TokenList):
-            for sub_token in token.tokens:
-                parse_tokens_resursive(sub_token)
-    for token in statement.tokens:
-        parse_tokens_resursive(token)
+        elif(isinstance(token, IdentifierList)):
+            stack.extend(reversed(list(token.get_identifiers())))
+        elif(type(token) is TokenList):
+            stack.extend(reversed(token.tokens))
     return names
 
 def read_url_content(url: str):
@@ -133,23 +132,33 @@ def interceptor(request: Request):
 # sqls = sqlparse.split(SQL2)
 # statement = sqlparse.parse(sqls[0])[0]
 
-timer = Stopwatch()
-timer.start()
-driver = webdriver.Chrome(options=chrome_options)
-driver.request_interceptor = interceptor
-test_script(driver)
-timer.stop()
-
-print(f"========== Elapsed miliseconds: {timer.elapsed*1000:.2f}")
-
-time.sleep(10)
-
-timer = Stopwatch()
-timer.start()
-test_script(driver)
-timer.stop()
-print(f"========== Elapsed miliseconds: {timer.elapsed*1000:.2f}")
-
-time.sleep(120)
+def debug_hold_seconds() -> float:
+    """
+    DEBUG_HOLD can be a number of seconds, any other value (true, yes...) holds the
+    browser for DEFAULT_DEBUG_HOLD_SECONDS.
+    """
+    try:
+        return float(os.getenv("DEBUG_HOLD"))
+    except ValueError:
+        return DEFAULT_DEBUG_HOLD_SECONDS
+
+async def timed_test_script(driver: webdriver.Chrome):
+    start = time.perf_counter()
+    # test_script blocks on the browser, keep it off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, test_script, driver)
+    print(f"========== Elapsed miliseconds: {(time.perf_counter() - start)*1000:.2f}")
+
+async def main():
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.request_interceptor = interceptor
+    try:
+        await timed_test_script(driver)
+        await timed_test_script(driver)
+        
+        # keeps the browser open to look at the page when DEBUG_HOLD is set
+        if(os.getenv("DEBUG_HOLD")):
+            await asyncio.sleep(debug_hold_seconds())
+    finally:
+        driver.quit()
 
-#driver.quit()
+asyncio.run(main())
@@ -0,0 +1,170 @@
+import base64
+import itertools
+import json
+import threading
+from typing import Callable
+from urllib.parse import parse_qsl, urlsplit
+import requests
+from selenium import webdriver
+from websocket import WebSocketApp
+
+class InterceptedRequest:
+    """
+    A request paused by the browser. Mirrors the small part of the seleniumwire Request
+    api used by the interceptors: url, params, body and create_response.
+    """
+    url: str
+    method: str
+    body: bytes
+    params: dict[str, str]
+    response: tuple[int, dict[str, str], str] | None # status, headers, base64 body
+
+    def __init__(self, url: str, method: str, body: bytes):
+        self.url = url
+        self.method = method
+        self.body = body
+        self.params = dict(parse_qsl(urlsplit(url).query))
+        self.response = None
+
+    def create_response(self, status_code: int, headers: dict[str, str] | None = None, body: bytes = b"", body_base64: str | None = None):
+        """
+        body_base64, when given, is sent as is instead of body. DevTools wants bodies in base64,
+        so bodies served on every request can be encoded once by the caller.
+        """
+        if(body_base64 is None):
+            body_base64 = base64.b64encode(body).decode("ascii")
+        self.response = (status_code, headers or {}, body_base64)
+
+def request_body(request: dict) -> bytes:
+    # recent Chrome versions send postDataEntries (base64), older ones only postData
+    entries = request.get("postDataEntries")
+    if(entries):
+        return b"".join(base64.b64decode(entry.get("bytes", "")) for entry in entries)
+    return request.get("postData", "").encode("utf-8")
+
+class CdpInterceptor:
+    """
+    Answers the requests of Chrome tabs from python through the DevTools Fetch domain.
+
+    It talks to the browser DevTools websocket directly, so no proxy sits between Chrome
+    and the network. Requests for which the handler does not create a response continue
+    to the network unchanged.
+    """
+    command_timeout_seconds: float = 10
+
+    def __init__(self, driver: webdriver.Chrome, handler: Callable[[InterceptedRequest], None]):
+        self.handler = handler
+        debugger_address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        ws_url = requests.get(f"http://{debugger_address}/json/version", timeout=self.command_timeout_seconds).json()["webSocketDebuggerUrl"]
+
+        self._ids = itertools.count(1)
+        self._pending: dict[int, list] = {} # message id -> [event set on response, response]
+        self._event_handlers: dict[str, Callable[[str, dict], None]] = {} # session id -> handler
+        self._error_handlers: dict[str, Callable[[InterceptedRequest, Exception], None]] = {} # session id -> handler
+        self._closed = False
+        opened = threading.Event()
+        self._ws = WebSocketApp(ws_url, on_open=lambda ws: opened.set(), on_message=self._on_message, on_close=self._on_close)
+        # Chrome only accepts websocket connections without an Origin header (unless --remote-allow-origins)
+        self._thread = threading.Thread(target=self._ws.run_forever, kwargs={"suppress_origin": True}, daemon=True)
+        self._thread.start()
+        if(not opened.wait(self.command_timeout_seconds)):
+            raise Exception(f"could not connect to the browser DevTools at {ws_url}")
+
+    def send(self, method: str, params: dict | None = None, session_id: str | None = None, wait: bool = True, timeout_seconds: float | None = None) -> dict:
+        message_id = next(self._ids)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if(session_id):
+            message["sessionId"] = session_id
+        if(wait):
+            pending = self._pending[message_id] = [threading.Event(), None]
+        # checked after registering, so a close racing with this call still fails the command
+        if(self._closed):
+            self._pending.pop(message_id, None)
+            raise Exception(f"DevTools command {method} failed: the connection is closed")
+
+        self._ws.send(json.dumps(message))
+        if(not wait):
+            return {}
+
+        if(not pending[0].wait(timeout_seconds or self.command_timeout_seconds)):
+            self._pending.pop(message_id, None)
+            raise Exception(f"DevTools command {method} timed out")
+        response = self._pending.pop(message_id)[1]
+        if("error" in response):
+            raise Exception(f"DevTools command {method} failed: {response['error']}")
+        return response.get("result", {})
+
+    def attach(
+        self,
+        target_id: str,
+        on_event: Callable[[str, dict], None] | None = None,
+        on_handler_error: Callable[[InterceptedRequest, Exception], None] | None = None
+    ) -> str:
+        """
+        Starts intercepting every request of the target (a chromedriver window handle is its target id).
+        Returns the DevTools session id, the interception stops when the target is closed.
+        on_event receives the method and params of the other events sent on the session.
+        on_handler_error receives the exceptions raised by the handler for the session requests,
+        which are answered with Fetch.failRequest.
+        """
+        session_id = self.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})["sessionId"]
+        if(on_event):
+            self._event_handlers[session_id] = on_event
+        if(on_handler_error):
+            self._error_handlers[session_id] = on_handler_error
+        self.send("Fetch.enable", {"patterns": [{"urlPattern": "*"}]}, session_id)
+        return session_id
+
+    def detach(self, session_id: str):
+        self._event_handlers.pop(session_id, None)
+        self._error_handlers.pop(session_id, None)
+
+    def close(self):
+        self._ws.close()
+
+    def _on_close(self, ws, close_status_code, close_message):
+        # the browser is gone (or close was called), fail every waiting command now instead of at its timeout
+        self._closed = True
+        for pending in list(self._pending.values()):
+            pending[1] = {"error": {"message": "DevTools connection closed"}}
+            pending[0].set()
+
+    def _on_message(self, ws, message: str):
+        data = json.loads(message)
+        if("id" in data):
+            pending = self._pending.get(data["id"])
+            if(pending):
+                pending[1] = data
+                pending[0].set()
+        elif(data.get("method") == "Fetch.requestPaused"):
+            self._on_request_paused(data["sessionId"], data["params"])
+        else:
+            on_event = self._event_handlers.get(data.get("sessionId"))
+            if(on_event):
+                on_event(data["method"], data.get("params", {}))
+
+    def _on_request_paused(self, session_id: str, params: dict):
+        # runs on the websocket thread, so answers are sent without waiting for the reply
+        request = params["request"]
+        intercepted = InterceptedRequest(request["url"], request["method"], request_body(request))
+        try:
+            self.handler(intercepted)
+        except Exception as error:
+            self.send("Fetch.failRequest", {"requestId": params["requestId"], "errorReason": "Failed"}, session_id, wait=False)
+            # raising here would only reach the websocket-client logger, hand it to the session owner instead
+            on_handler_error = self._error_handlers.get(session_id)
+            if(on_handler_error):
+                on_handler_error(intercepted, error)
+            return
+
+        if(intercepted.response is None):
+            self.send("Fetch.continueRequest", {"requestId": params["requestId"]}, session_id, wait=False)
+            return
+
+        status_code, headers, body_base64 = intercepted.response
+        self.send("Fetch.fulfillRequest", {
+            "requestId": params["requestId"],
+            "responseCode": status_code,
+            "responseHeaders": [{"name": name, "value": value} for name, value in headers.items()],
+            "body": body_base64
+        }, session_id, wait=False)
@@ -1,15 +1,116 @@
 import asyncio
-from asyncio.locks import Condition
+import atexit
+import base64
+import hashlib
+import os
+from functools import cache, lru_cache
 from pathlib import Path
-import time
+import re
+import tempfile
+import threading
 import uuid
 import sqlparse
 import requests
-from seleniumwire import webdriver
+from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from seleniumwire.handler import Request
-from sqlparse.sql import Identifier, Statement, TokenList, Token, IdentifierList
+from sqlparse.sql import Identifier, Statement, TokenList, IdentifierList
+from .cdp_interceptor import CdpInterceptor, InterceptedRequest
+
+# line:column anywhere in a browser error message, \s* allows for optional leading whitespace
+ERROR_LINE_RE = re.compile(r'\s*(\d+):(\d+)')
+
+# url the watcher script shows up with in stack traces, so its frames can be skipped
+PAGE_WATCHER_SOURCE_URL = "html_tester_page_watcher.js"
+
+# Injected in every test tab before any page script runs. It counts uncaught errors,
+# console.error calls (reported as SEVERE by the browser log) and in-flight fetch calls
+# and notifies the listeners registered by the wait script below, so the tester can
+# react to page activity instead of polling the browser logs.
+PAGE_WATCHER_SCRIPT = """
+(() => {
+    const state = window.__htmlTester = { errors: 0, pending: 0, listeners: [] };
+    const notify = () => state.listeners.forEach((listener) => listener());
+    const onError = () => { state.errors++; notify(); };
+    window.addEventListener("error", onError);
+    window.addEventListener("unhandledrejection", onError);
+    const originalConsoleError = console.error;
+    console.error = function (...args) {
+        const result = originalConsoleError.apply(this, args);
+        onError();
+        return result;
+    };
+    const originalFetch = window.fetch;
+    window.fetch = function (...args) {
+        state.pending++;
+        notify();
+        return originalFetch.apply(this, args).finally(() => { state.pending--; notify(); });
+    };
+})();
+//# sourceURL=""" + PAGE_WATCHER_SOURCE_URL + """
+"""
+
+# Function returning a promise that resolves as soon as the page reports an error, or
+# once no fetch has been pending for quietMs, or when the maxMs budget is over.
+# It resolves with the number of errors the watcher counted, or null if the watcher is missing.
+WAIT_FOR_ERROR_OR_QUIET_SCRIPT = """
+((quietMs, maxMs) => new Promise((done) => {
+    const state = window.__htmlTester;
+    if (!state) { done(null); return; }
+    let quietTimer = null;
+    const budgetTimer = setTimeout(() => done(state.errors), maxMs);
+    // resolving is deferred to a new task: settle runs inside the page error listeners,
+    // and Chrome only reports the error to DevTools after those listeners return
+    const finish = () => {
+        clearTimeout(quietTimer);
+        clearTimeout(budgetTimer);
+        setTimeout(() => done(state.errors), 0);
+    };
+    const settle = () => {
+        clearTimeout(quietTimer);
+        if (state.errors > 0) { finish(); return; }
+        if (state.pending === 0) quietTimer = setTimeout(finish, quietMs);
+    };
+    state.listeners.push(settle);
+    settle();
+}))
+"""
+
+def statement_column_names(statement: Statement) -> list[str]:
+    names = []
+    # Iterative walk, children are pushed reversed to keep the column order.
+    # Identifiers are not descended into, and only plain TokenLists are walked
+    # (not Where/Parenthesis/Function), same as the previous recursive version.
+    stack = list(reversed(statement.tokens))
+    while(stack):
+        token = stack.pop()
+        if(isinstance(token, Identifier)):
+            names.append(token.get_name())
+        elif(isinstance(token, IdentifierList)):
+            stack.extend(reversed(list(token.get_identifiers())))
+        elif(type(token) is TokenList):
+            stack.extend(reversed(token.tokens))
+    return names
+
+@lru_cache(maxsize=256)
+def sql_column_names(sql: str) -> tuple[str, ...]:
+    """
+    Column names selected by the first statement of sql. The dashboard sends the same
+    few queries on every load, so the parse result is cached by the raw sql text.
+    """
+    return tuple(statement_column_names(sqlparse.parse(sql)[0]))
+
+def write_text_atomic(path: Path, text: str):
+    """
+    Writes text to a temporary file next to path and renames it over path, so other
+    processes reading path never see a partially written file.
+    """
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False) as file:
+        file.write(text)
+    try:
+        os.replace(file.name, path)
+    except OSError:
+        os.unlink(file.name)
+        raise
 
 class HtmlTesterSnippet:
     html: str
@@ -22,23 +123,125 @@ class HtmlTesterSnippet:
 class Script:
     url: str
     content: str
+    content_bytes: bytes
+    content_base64: str
     lines_offset: int
     name: str
     def __init__(self, content: str, url: str, name: str):
         self.content = content
+        self.content_bytes = content.encode("utf-8")
+        self.content_base64 = base64.b64encode(self.content_bytes).decode("ascii") # served as is by the interceptor
         self.url = url
         self.lines_offset = len(content.split("\n"))
         self.name = name
 
+def console_log_entry(method: str, params: dict) -> dict | None:
+    """
+    Converts a DevTools error event into a browser log entry, with the message formatted
+    like the ones chromedriver returns from get_log("browser"). Returns None for other events.
+    """
+    if(method == "Runtime.exceptionThrown"):
+        details = params["exceptionDetails"]
+        text = details.get("text", "")
+        description = details.get("exception", {}).get("description")
+        if(description):
+            text += " " + description.split("\n")[0]
+        location = f"{details.get('lineNumber', 0) + 1}:{details.get('columnNumber', 0) + 1}"
+        return {"level": "SEVERE", "message": f"{details.get('url', '')} {location} {text}"}
+    if(method == "Runtime.consoleAPICalled" and params.get("type") == "error"):
+        text = " ".join(str(arg.get("value", arg.get("description", ""))) for arg in params.get("args", []))
+        # the console.error wrapper of the watcher script is the top frame, report the caller
+        frames = [
+            frame for frame in params.get("stackTrace", {}).get("callFrames", [])
+            if frame["url"] != PAGE_WATCHER_SOURCE_URL
+        ]
+        if(frames):
+            location = f"{frames[0]['lineNumber'] + 1}:{frames[0]['columnNumber'] + 1}"
+            return {"level": "SEVERE", "message": f"{frames[0]['url']} {location} {text}"}
+        return {"level": "SEVERE", "message": f"console-api {text}"}
+    if(method == "Log.entryAdded" and params["entry"]["level"] == "error"):
+        entry = params["entry"]
+        return {"level": "SEVERE", "message": f"{entry.get('url', '')} - {entry['text']}"}
+    return None
+
+class TestTab:
+    """
+    A tab opened in its own browser context, so tests running at the same time on one
+    browser don't share cookies, storage or cache. It is driven through its own DevTools
+    session instead of chromedriver, whose current window can't be shared between tests.
+    """
+    devtools: CdpInterceptor
+    logs: list[dict]
+
+    def __init__(self, devtools: CdpInterceptor):
+        self.devtools = devtools
+        self.logs = []
+        # loader ids of the navigations that fired their load event
+        self._loaded_loader_ids: set[str] = set()
+        self._load_condition = threading.Condition()
+        self.page_error_logged = threading.Event() # an uncaught error or console.error was reported
+        # disposeOnDetach: the context goes away with the DevTools connection if close is never called
+        self.context_id = devtools.send("Target.createBrowserContext", {"disposeOnDetach": True})["browserContextId"]
+        try:
+            target_id = devtools.send("Target.createTarget", {"url": "about:blank", "browserContextId": self.context_id})["targetId"]
+            self.session_id = devtools.attach(target_id, self.on_event, self.on_handler_error)
+        except Exception:
+            devtools.send("Target.disposeBrowserContext", {"browserContextId": self.context_id})
+            raise
+
+    def send(self, method: str, params: dict | None = None, timeout_seconds: float | None = None) -> dict:
+        return self.devtools.send(method, params, self.session_id, timeout_seconds=timeout_seconds)
+
+    def on_event(self, method: str, params: dict):
+        # runs on the DevTools websocket thread
+        if(method == "Page.lifecycleEvent" and params["name"] == "load"):
+            with self._load_condition:
+                self._loaded_loader_ids.add(params["loaderId"])
+                self._load_condition.notify_all()
+            return
+        entry = console_log_entry(method, params)
+        if(entry):
+            self.logs.append(entry)
+            if(method.startswith("Runtime.")):
+                self.page_error_logged.set()
+
+    def wait_for_load(self, loader_id: str, timeout_seconds: float) -> bool:
+        """
+        Waits for the load event of the navigation with loader_id, the initial about:blank
+        load (or any other navigation) does not count.
+        """
+        with self._load_condition:
+            return self._load_condition.wait_for(lambda: loader_id in self._loaded_loader_ids, timeout_seconds)
+
+    def on_handler_error(self, request: InterceptedRequest, error: Exception):
+        # runs on the DevTools websocket thread, the request was failed in the browser
+        self.logs.append({"level": "SEVERE", "message": f"{request.url} - interceptor failed: {error}"})
+
+    def close(self):
+        self.devtools.detach(self.session_id)
+        self.devtools.send("Target.disposeBrowserContext", {"browserContextId": self.context_id})
+
 class HtmlTester:
     snippets_map: dict[str, HtmlTesterSnippet]
     default_chrome_options: Options
     original_chart_library_url: str =  "https://cdn.jsdelivr.net/npm/chart.js"
+    # downloaded libraries are kept here between runs
+    cache_folder: Path = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "html_tester"
     dashboard_script: Script
     chart_library_script: Script
-    current_snippet:str | None
-    driver: webdriver.Chrome | None = None
     max_wait_time_seconds: float = 2.0
+    quiet_period_seconds: float = 0.1
+    debug_dump_html: bool = False
+    # static assets the snippet may reference but that never affect the test result.
+    # Chrome blocks them before sending the request, so they don't reach the interceptor
+    blocked_url_patterns: list[str] = [
+        "*.css*", "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.svg*", "*.webp*", "*.ico*",
+        "*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*fonts.googleapis.com*", "*fonts.gstatic.com*"
+    ]
+    max_concurrent_tests: int = 4
+    page_load_timeout_seconds: float = 10
+    # how long to wait for the DevTools event of an error the page already counted
+    error_event_grace_seconds: float = 1.0
     
     def get_file_content(self, file_name: str):
         with open(file_name, "r", encoding="utf-8") as file:
@@ -48,50 +251,59 @@ class HtmlTester:
         response = requests.get(url)
         return response.text
         
+    def load_chart_library_content(self) -> str:
+        """
+        Downloads chart.js to the cache folder. When a cached copy exists the download is a
+        conditional request on its ETag, and the cached copy is used if the cdn can't be reached.
+        The cached files are named after the url, so changing it never reuses another library.
+        """
+        url_hash = hashlib.sha256(self.original_chart_library_url.encode("utf-8")).hexdigest()[:16]
+        cache_file = self.cache_folder / f"chart-{url_hash}.js"
+        etag_file = cache_file.with_suffix(".etag")
+        headers = {}
+        if(cache_file.exists() and etag_file.exists()):
+            headers["If-None-Match"] = etag_file.read_text(encoding="utf-8")
+        
+        try:
+            response = requests.get(self.original_chart_library_url, headers=headers, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException:
+            if(cache_file.exists()):
+                return cache_file.read_text(encoding="utf-8")
+            raise
+        
+        if(response.status_code == 304):
+            return cache_file.read_text(encoding="utf-8")
+        
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        # the body goes first, so an ETag on disk never belongs to a newer body than the one cached
+        write_text_atomic(cache_file, response.text)
+        etag = response.headers.get("ETag")
+        if(etag):
+            write_text_atomic(etag_file, etag)
+        else:
+            etag_file.unlink(missing_ok=True)
+        return response.text
+        
     def get_column_names(self,statement: Statement):
-        names = []
-        def parse_tokens_resursive(token):
-            if(type(token) == Identifier):
-                names.append(token.get_name())
-
-            if(type(token) == IdentifierList):
-                for identifier in token.get_identifiers():
-                    parse_tokens_resursive(identifier)
-            if(type(token) == TokenList):
-                for sub_token in token.tokens:
-                    parse_tokens_resursive(sub_token)
-        for token in statement.tokens:
-            parse_tokens_resursive(token)
-        return names         
+        return statement_column_names(statement)
     
     def fake_fetch_csv_response(self, sql: str):
-        headers = self.get_column_names(sqlparse.parse(sql)[0])
-        reponse = ""
-        headers_row = []
-        for header in headers:
-            headers_row.append(header)
-            
-        reponse += ",".join(headers_row) + "\n"
-
+        headers = sql_column_names(sql)
+        rows = [",".join(headers)]
+        # rows start with an extra index value, so they have one more value than the headers
+        values_count = len(headers) + 1
         for i in range(3):
-            row = [str(i)]
-            for header in headers:
-                row.append(str(i))
-            reponse += ",".join(row) + "\n"
-        return reponse    
+            rows.append(",".join([str(i)] * values_count))
+        return "\n".join(rows) + "\n"    
 
     def adjust_error_line_number(self, error_message: str) -> str:
         """
         Adjusts the line number in error messages by subtracting the lines_offset.
         Handles error messages in format like "387:17 Uncaught SyntaxError: Unexpected token ')'"
         """
-        import re
-        
-        # Pattern to match line:column format anywhere in the error message
-        # \s* allows for optional leading whitespace
-        pattern = r'\s*(\d+):(\d+)'
-        match = re.search(pattern, error_message)
-        is_local_script = error_message.find("generated_scrit") != -1
+        match = ERROR_LINE_RE.search(error_message)
+        is_local_script = "generated_scrit" in error_message
         
         if match:
             original_line = int(match.group(1))
@@ -103,15 +315,17 @@ class HtmlTester:
                 adjusted_line = str(adjusted_line) + " to " + str(adjusted_line + 1)
                 
                 # Replace the original line:column with adjusted line:column
-                adjusted_error = re.sub(pattern, f'line: {adjusted_line}, column: {column}', error_message)
+                adjusted_error = ERROR_LINE_RE.sub(f'line: {adjusted_line}, column: {column}', error_message)
                 return adjusted_error
             else:
                 return error_message
         
         return error_message
 
-    def __init__(self, public_folder: Path, headless: bool = True, max_wait_time_seconds: int = 2) -> None:
+    def __init__(self, public_folder: Path, headless: bool = True, max_wait_time_seconds: int = 2, max_concurrent_tests: int = 4, debug_dump_html: bool = False) -> None:
         self.max_wait_time_seconds = max_wait_time_seconds
+        self.max_concurrent_tests = max_concurrent_tests
+        self.debug_dump_html = debug_dump_html # writes the generated page to full_html_snippet.html on every request
         self.default_chrome_options = Options()
         if(headless):
             self.default_chrome_options.add_argument("--headless")  # Run Chrome in headless mode 
@@ -122,14 +336,76 @@ class HtmlTester:
         
         self.snippets_map: dict[str, HtmlTesterSnippet] = {}
         
+        # Chrome is expensive to start, so one instance is kept alive and shared by all
+        # tests. Each test runs in a tab of its own browser context, up to max_concurrent_tests at once.
+        self._driver: webdriver.Chrome | None = None
+        self._devtools: CdpInterceptor | None = None
+        self._browser_lock = threading.Lock() # guards starting and closing the shared browser
+        # a Semaphore belongs to the event loop it is first used on, and the tester is shared
+        # by every loop of the process (e.g. successive asyncio.run calls), so it is rebuilt per loop
+        self._test_slots: asyncio.Semaphore | None = None
+        self._test_slots_loop: asyncio.AbstractEventLoop | None = None
+        atexit.register(self.close)
+        
         self.dashboard_javascript_content = self.get_file_content(public_folder / "dashboard_javascript.js")
-        self.chart_library_content = self.read_url_content(self.original_chart_library_url)
+        self.chart_library_content = self.load_chart_library_content()
         self.dashboard_script = Script(self.dashboard_javascript_content, "dashboard_javascript.js", "dashboard_javascript")
         self.chart_library_script = Script(self.chart_library_content, "chart.js", "chart_library")
-        self.html_header_content_lines = len(self.html_header_content().split("\n"))
-        self.html_style_close_header_lines = len(self.html_style_close_header().split("\n"))
         self.lines_offset = self.dashboard_script.lines_offset + self.chart_library_script.lines_offset - 1 #+ 1 for the div
         
+        # the page around the snippet never changes, build (and encode) it only once
+        html_start, html_end = self.html_snippet_scaffold([self.dashboard_script, self.chart_library_script])
+        self._html_prefix = html_start.encode("utf-8")
+        self._html_suffix = html_end.encode("utf-8")
+        
+    def get_devtools(self) -> CdpInterceptor:
+        """
+        Returns the connection to the shared browser, starting it on first use. Blocks for the
+        whole browser start, so it is meant to run in an executor.
+        """
+        with self._browser_lock:
+            if(self._devtools is None):
+                driver = webdriver.Chrome(options=self.default_chrome_options)
+                try:
+                    devtools = CdpInterceptor(driver, self.interceptor)
+                except Exception:
+                    driver.quit() # the handshake failed, don't leave the browser running
+                    raise
+                self._driver = driver
+                self._devtools = devtools
+            return self._devtools
+    
+    def test_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if(self._test_slots_loop is not loop):
+            self._test_slots = asyncio.Semaphore(self.max_concurrent_tests)
+            self._test_slots_loop = loop
+        return self._test_slots
+    
+    def browser_responsive(self) -> bool:
+        try:
+            self._devtools.send("Browser.getVersion")
+            return True
+        except Exception:
+            return False
+    
+    def close_if_unresponsive(self):
+        # the browser is unusable (crashed or closed), drop it so a new one gets created
+        if(not self.browser_responsive()):
+            self.close()
+    
+    def close(self):
+        with self._browser_lock:
+            if(self._devtools):
+                self._devtools.close()
+            if(self._driver):
+                try:
+                    self._driver.quit()
+                except Exception:
+                    pass
+            self._driver = None
+            self._devtools = None
+    
     def html_header_content(self):
         html_start = "<html><body>"
         html_start += "<head>"
@@ -142,51 +418,55 @@ class HtmlTester:
         
         return html_style 
     
-    def prepare_html_snippet(self, html_snippet: str, scripts: list[Script]):
-        html_end = "</body></html>"
-        html_full = self.html_header_content()
+    def html_snippet_scaffold(self, scripts: list[Script]) -> tuple[str, str]:
+        """
+        Returns the html that goes before and after the snippet. It does not depend on the snippet.
+        """
+        html_start = self.html_header_content()
         for script in scripts:
-            html_full += f"<script src=\"{script.url}\" id=\"{script.name}\"></script>"
+            html_start += f"<script src=\"{script.url}\" id=\"{script.name}\"></script>"
 
-        html_full += self.html_style_close_header()
-        html_full += "<div>" + html_snippet + "</div>"
-        html_full += html_end
-        return html_full        
+        html_start += self.html_style_close_header()
+        html_start += "<div>"
+        html_end = "</div></body></html>"
+        return html_start, html_end
+    
+    def prepare_html_snippet(self, html_snippet: str, scripts: list[Script]):
+        html_start, html_end = self.html_snippet_scaffold(scripts)
+        return html_start + html_snippet + html_end        
     
-    def interceptor(self, request: Request):
+    def interceptor(self, request: InterceptedRequest):
         if(request.url.find("snippet_id") != -1):
             snippet_id = request.params.get("snippet_id")
             if(not snippet_id):
                 raise Exception("no snippet_id found in the request url")
             
-            snippet = self.snippets_map[snippet_id]
+            snippet = self.snippets_map.get(snippet_id)
             if(not snippet):
                 raise Exception(f"snippet with id {snippet_id} not found")
             
-            full_html_snippet = self.prepare_html_snippet(
-                snippet.html,
-                [self.dashboard_script, self.chart_library_script]
-            )
+            full_html_snippet = self._html_prefix + snippet.html.encode("utf-8") + self._html_suffix
             
-            with open("full_html_snippet.html", "w") as file:
-                file.write(full_html_snippet)
+            if(self.debug_dump_html):
+                with open("full_html_snippet.html", "wb") as file:
+                    file.write(full_html_snippet)
             
             request.create_response(
                 status_code=200,
                 headers={'Content-Type': 'text/html'},  # Optional headers dictionary
-                body=full_html_snippet.encode("utf-8")
+                body=full_html_snippet
             )
         elif(request.url.find("dashboard_javascript.js") != -1):
             request.create_response(
                 status_code=200,
                 headers={'Content-Type': 'text/javascript'},  # Optional headers dictionary
-                body=self.dashboard_script.content.encode("utf-8")
+                body_base64=self.dashboard_script.content_base64
             )
         elif(request.url.find("chart.js") != -1):
             request.create_response(
                 status_code=200,
                 headers={'Content-Type': 'text/javascript'},  # Optional headers dictionary
-                body=self.chart_library_script.content.encode("utf-8")
+                body_base64=self.chart_library_script.content_base64
             )
         elif(request.url.find("fetchData") != -1):
             sql = request.body.decode("utf-8")
@@ -199,56 +479,133 @@ class HtmlTester:
         else:
             request.create_response(
                 status_code=200,
-                body="".encode()
+                body=b""
             )
     
+    def load_page(self, tab: TestTab, url: str):
+        """
+        Prepares the tab (watcher script, blocked assets, error events) and navigates it to url,
+        blocking until the page load event fires. Meant to run in an executor.
+        """
+        tab.send("Page.enable")
+        tab.send("Page.setLifecycleEventsEnabled", {"enabled": True})
+        tab.send("Runtime.enable")
+        tab.send("Log.enable")
+        tab.send("Page.addScriptToEvaluateOnNewDocument", {"source": PAGE_WATCHER_SCRIPT})
+        tab.send("Network.enable")
+        tab.send("Network.setBlockedURLs", {"urls": self.blocked_url_patterns})
+        result = tab.send("Page.navigate", {"url": url})
+        if(result.get("errorText")):
+            # Chrome still fires the load event for its error page, so this must be checked here
+            details = "".join(f"; {log['message']}" for log in tab.logs)
+            raise Exception(f"could not load the snippet page: {result['errorText']}{details}")
+        if(not tab.wait_for_load(result.get("loaderId"), self.page_load_timeout_seconds)):
+            raise TimeoutError(f"page did not load within {self.page_load_timeout_seconds} seconds")
+    
+    def wait_for_error_or_quiet(self, tab: TestTab) -> int:
+        """
+        Blocks until the page reports an error, stays quiet (no pending fetch) for
+        quiet_period_seconds, or max_wait_time_seconds elapse. Meant to run in an executor.
+        Returns the number of errors counted by the page.
+        """
+        quiet_ms = int(self.quiet_period_seconds * 1000)
+        max_ms = int(self.max_wait_time_seconds * 1000)
+        response = tab.send(
+            "Runtime.evaluate",
+            {
+                "expression": f"{WAIT_FOR_ERROR_OR_QUIET_SCRIPT}({quiet_ms}, {max_ms})",
+                "awaitPromise": True,
+                "returnByValue": True
+            },
+            timeout_seconds=self.max_wait_time_seconds + 1
+        )
+        page_errors = response.get("result", {}).get("value")
+        if(page_errors is None):
+            # the snippet page is not the one loaded, or the wait script itself failed
+            raise Exception("the page watcher is missing from the tab, the snippet page did not run")
+        return page_errors
+    
+    def log_errors(self, logs: list[dict], full_url: str, base_url: str) -> list[str]:
+        errors: list[str] = []
+        for log in logs:
+            if(log["level"] == "SEVERE" or log["level"] == "ERROR"):
+                if(log["message"].find("net::ERR_BLOCKED_BY_CLIENT") != -1):
+                    continue # asset blocked on purpose by blocked_url_patterns
+                
+                message = log["message"]
+                
+                is_from_local_script = message.find(full_url) != -1
+                
+                error_message = log["message"].replace(full_url, "generated_scrit: ")
+                error_message = error_message.replace(base_url, "").strip()
+                error_message = self.adjust_error_line_number(error_message) if is_from_local_script else error_message
+
+                # Adjust the line number in the error message
+                errors.append(error_message)
+        return errors
+    
+    async def run_page(self, tab: TestTab, errors: list[str], full_url: str, base_url: str):
+        """
+        Navigates the tab to the snippet page, waits for it to report an error or settle,
+        then adds the errors the tab collected to errors. The blocking DevTools calls run
+        in an executor so the event loop stays free.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load_page, tab, full_url)
+        page_errors = await loop.run_in_executor(None, self.wait_for_error_or_quiet, tab)
+        if(page_errors > 0 and not tab.page_error_logged.is_set()):
+            # the page counted an error whose DevTools event has not arrived yet
+            await loop.run_in_executor(None, tab.page_error_logged.wait, self.error_event_grace_seconds)
+        errors.extend(self.log_errors(tab.logs, full_url, base_url))
+        if(page_errors > 0 and not errors):
+            errors.append(f"the page reported {page_errors} error(s) that did not reach the browser log")
+    
     async def test(self, html: str) -> [bool, list[str]]:
-        self.current_snippet = html
         uniqueid = str(uuid.uuid4())
         
-        self.snippets_map[uniqueid] = HtmlTesterSnippet(html, uniqueid)
-        
         base_url = "http://localhost:8080"
         full_url = f"{base_url}/?snippet_id={uniqueid}"
 
         
-        try:
-            success = True
-            errors:list[str] = []        
+        errors:list[str] = []        
+        
+        async with self.test_slots():
+            loop = asyncio.get_running_loop()
+            devtools = await loop.run_in_executor(None, self.get_devtools)
+            try:
+                tab = await loop.run_in_executor(None, TestTab, devtools)
+            except Exception:
+                await loop.run_in_executor(None, self.close_if_unresponsive)
+                raise
             
-            self.driver = webdriver.Chrome(options=self.default_chrome_options)
-            self.driver.request_interceptor = self.interceptor
-            self.driver.get(full_url)
-            wait = WebDriverWait(self.driver,10) # Wait for up to 10 seconds        
-            wait.until(lambda driver: driver.execute_script("return document.readyState === 'complete'"))
-
-            attempts = 0
-            total_wait_time = self.max_wait_time_seconds
-            split = total_wait_time/20
-            while(len(errors) == 0 and attempts*split < total_wait_time): #about total_wait_time seconds
-                logs = self.driver.get_log("browser")
-                for log in logs:
-                    if(log["level"] == "SEVERE" or log["level"] == "ERROR"):
-                        success = False
-                        
-                        message = log["message"]
-                        
-                        is_from_local_script = message.find(full_url) != -1
-                        
-                        error_message = log["message"].replace(full_url, "generated_scrit: ")
-                        error_message = error_message.replace(base_url, "").strip()
-                        error_message = self.adjust_error_line_number(error_message) if is_from_local_script else error_message
-
-                        # Adjust the line number in the error message
-                        errors.append(error_message)
-                attempts += 1
-                await asyncio.sleep(split)
-                
-        finally:
-            if(self.driver):
-                self.driver.quit()
+            self.snippets_map[uniqueid] = HtmlTesterSnippet(html, uniqueid)
+            try:
+                runner = asyncio.create_task(self.run_page(tab, errors, full_url, base_url))
+                # the page enforces max_wait_time_seconds itself, this only guards against a hung tab
+                timeout = asyncio.create_task(asyncio.sleep(self.page_load_timeout_seconds + self.max_wait_time_seconds + 5))
+                await asyncio.wait({runner, timeout}, return_when=asyncio.FIRST_COMPLETED)
+                timeout.cancel()
+                if(runner.done()):
+                    runner.result()
+                else:
+                    runner.cancel()
+                    errors.append("browser did not respond within the wait time")
+                    
+            finally:
+                self.snippets_map.pop(uniqueid, None)
+                # disposing the context closes the tab, even when its page is hung
+                try:
+                    await loop.run_in_executor(None, tab.close)
+                except Exception:
+                    await loop.run_in_executor(None, self.close_if_unresponsive)
                 
-        return success, errors
+        return len(errors) == 0, errors
 
         
-html_tester_singleton = HtmlTester(Path(".")) #users should use only this instance
+@cache
+def get_tester() -> HtmlTester:
+    """
+    Shared tester, users should use only this instance. It is created on first use so
+    importing the module doesn't read files or download chart.js.
+    """
+    return HtmlTester(Path("."))